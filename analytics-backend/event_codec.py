@@ -0,0 +1,145 @@
+"""
+Compact storage encoding for portfolio_events documents.
+
+Every summary scan reads each stored byte again, so events are stored with:
+
+- short field keys (FIELD_KEYS)
+- event_type and demo_name as small integer codes for known values (unknown
+  values are stored as the raw string)
+- the user agent interned into the user_agents collection under a hash of the
+  string, with only the hash on the event
+- a single server timestamp ("ts") instead of timestamp + created_at
+
+decode_event() maps stored documents (compact, or the legacy long-field form)
+back to the original field names, so API responses do not change.
+
+Code tables are append-only: never reorder or remove entries, or stored codes
+will decode to the wrong value.
+"""
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+USER_AGENTS_COLLECTION = "user_agents"
+
+# Stored key for each field
+FIELD_KEYS = {
+    "event_type": "t",
+    "timestamp": "ts",
+    "shard": "sh",
+    "sample_weight": "w",
+    "page": "p",
+    "demo_name": "d",
+    "api_endpoint": "e",
+    "api_method": "m",
+    "success": "ok",
+    "error_message": "err",
+    "session_id": "s",
+    "user_agent_hash": "ua",
+}
+_FIELD_NAMES = {key: name for name, key in FIELD_KEYS.items()}
+
+# Append-only code tables (code = index)
+EVENT_TYPES: List[str] = [
+    "page_view",
+    "page_exit",
+    "api_call",
+    "demo_viewed",
+    "demo_clicked",
+    "code_copied",
+    "example_clicked",
+    "click",
+    "manual_test",
+]
+DEMO_NAMES: List[str] = [
+    "API Explorer",
+    "GCP Architecture",
+    "Stripe Integration",
+    "Interactive API Explorer",
+    "GCP Cloud Architecture Guide",
+    "Stripe Payment Integration",
+]
+_EVENT_TYPE_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+_DEMO_NAME_CODES = {name: code for code, name in enumerate(DEMO_NAMES)}
+
+
+def _encode_enum(value: str, codes: Dict[str, int]) -> Union[int, str]:
+    return codes.get(value, value)
+
+
+def _decode_enum(value: Union[int, str, None], names: List[str]) -> Optional[str]:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return names[value] if 0 <= value < len(names) else None
+    return value
+
+
+def user_agent_key(user_agent: str) -> str:
+    """Document ID for an interned user agent (64-bit hex digest)"""
+    return hashlib.blake2b(user_agent.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def encode_event(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Encode an event from long field names to the stored form.
+
+    Expects user_agent_hash rather than the user agent itself; None values
+    are omitted.
+    """
+    doc = {}
+    for name, value in fields.items():
+        if value is None:
+            continue
+        if name == "event_type":
+            value = _encode_enum(value, _EVENT_TYPE_CODES)
+        elif name == "demo_name":
+            value = _encode_enum(value, _DEMO_NAME_CODES)
+        doc[FIELD_KEYS[name]] = value
+    return doc
+
+
+def _iso(value: Any) -> Optional[str]:
+    """Render a stored timestamp like the original naive-UTC created_at strings"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).isoformat()
+    return value
+
+
+def decode_event(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decode a stored event to long field names.
+
+    Legacy documents (written before the compact encoding) are returned with
+    created_at as their timestamp. In both cases "created_at" holds an ISO
+    string, as the API has always returned.
+    """
+    if "t" not in doc:
+        event = dict(doc)
+        event.setdefault("created_at", _iso(doc.get("timestamp")))
+        return event
+
+    event = {_FIELD_NAMES.get(key, key): value for key, value in doc.items()}
+    event["event_type"] = _decode_enum(event.get("event_type"), EVENT_TYPES)
+    if "demo_name" in event:
+        event["demo_name"] = _decode_enum(event["demo_name"], DEMO_NAMES)
+    event["created_at"] = _iso(event.get("timestamp"))
+    return event
+
+
+class InternCache:
+    """Bounded record of user agent keys already written by this instance"""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._keys: "OrderedDict[str, None]" = OrderedDict()
+
+    def __contains__(self, key: str) -> bool:
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def add(self, key: str) -> None:
+        self._keys[key] = None
+        if len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
@@ -0,0 +1,160 @@
+"""
+Top-K heavy hitters for high-cardinality event fields.
+
+Counting every distinct api_endpoint, page or error_message over 30 days
+does not scale, so each dimension is tracked per day with a Space-Saving
+sketch: at most ``capacity`` counters. Any value whose true count exceeds
+total / capacity is guaranteed to be tracked, and each count overestimates
+by at most its recorded ``error``.
+
+Sketches are mergeable. Each instance keeps pending sketches in memory and
+periodically merges them, in a transaction, into one stored document per UTC
+day in ``event_topk/{YYYY-MM-DD}``. Updating that document on every event
+would exceed Firestore's sustained write rate for a single document. The
+summary merges the stored days back together.
+"""
+import heapq
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from google.cloud import firestore
+
+TOPK_COLLECTION = "event_topk"
+DIMENSIONS = ("api_endpoint", "page", "error_message")
+
+# Longer values are truncated so stored sketches stay well under 1 MiB
+MAX_VALUE_LENGTH = 256
+
+
+class SpaceSaving:
+    """Space-Saving sketch (Metwally et al.) with weighted updates"""
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        # value -> [count, error]; count overestimates the true count by <= error
+        self.counters: Dict[str, List[float]] = {}
+
+    def add(self, value: str, weight: float = 1.0) -> None:
+        value = value[:MAX_VALUE_LENGTH]
+        counter = self.counters.get(value)
+        if counter is not None:
+            counter[0] += weight
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[value] = [weight, 0.0]
+            return
+        # Replace the smallest counter; the newcomer inherits its count as error
+        victim = min(self.counters, key=lambda v: self.counters[v][0])
+        floor = self.counters.pop(victim)[0]
+        self.counters[value] = [floor + weight, floor]
+
+    def min_count(self) -> float:
+        """Upper bound on the count of any value not being tracked"""
+        if len(self.counters) < self.capacity:
+            return 0.0
+        return min(counter[0] for counter in self.counters.values())
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """
+        Combine two sketches into a new one (Agarwal et al. mergeable summaries).
+
+        A value missing from one side may still have occurred there up to that
+        side's min_count, which is added to both its count and its error.
+        """
+        min_self, min_other = self.min_count(), other.min_count()
+        combined = {}
+        for value in self.counters.keys() | other.counters.keys():
+            count_a, error_a = self.counters.get(value, (min_self, min_self))
+            count_b, error_b = other.counters.get(value, (min_other, min_other))
+            combined[value] = [count_a + count_b, error_a + error_b]
+
+        merged = SpaceSaving(max(self.capacity, other.capacity))
+        merged.counters = dict(
+            heapq.nlargest(merged.capacity, combined.items(), key=lambda item: item[1][0])
+        )
+        return merged
+
+    def top(self, n: int) -> List[Tuple[str, float, float]]:
+        """The n largest (value, count, error) entries, largest first"""
+        return [
+            (value, count, error)
+            for value, (count, error) in heapq.nlargest(
+                n, self.counters.items(), key=lambda item: item[1][0]
+            )
+        ]
+
+    def to_list(self) -> List[dict]:
+        """Firestore-friendly form (arrays of maps; values may contain any characters)"""
+        return [{"v": v, "c": c, "e": e} for v, (c, e) in self.counters.items()]
+
+    @classmethod
+    def from_list(cls, entries: Optional[Iterable[dict]], capacity: int = 100) -> "SpaceSaving":
+        sketch = cls(capacity)
+        for entry in entries or ():
+            sketch.counters[entry["v"]] = [entry["c"], entry["e"]]
+        return sketch
+
+
+class TopKTracker:
+    """
+    Pending per-day, per-dimension sketches for this instance.
+
+    Only used from the event loop, so it needs no locking.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.pending: Dict[str, Dict[str, SpaceSaving]] = {}
+
+    def record(self, day: str, dimension: str, value: Optional[str], weight: float = 1.0) -> None:
+        if not value:
+            return
+        sketches = self.pending.setdefault(day, {})
+        sketch = sketches.get(dimension)
+        if sketch is None:
+            sketch = sketches[dimension] = SpaceSaving(self.capacity)
+        sketch.add(value, weight)
+
+    def drain(self) -> Dict[str, Dict[str, SpaceSaving]]:
+        """Hand over all pending sketches and start empty"""
+        drained, self.pending = self.pending, {}
+        return drained
+
+    def restore(self, drained: Dict[str, Dict[str, SpaceSaving]]) -> None:
+        """Merge sketches back in after a failed flush"""
+        for day, sketches in drained.items():
+            for dimension, sketch in sketches.items():
+                current = self.pending.setdefault(day, {}).get(dimension)
+                self.pending[day][dimension] = sketch if current is None else current.merge(sketch)
+
+
+def store_day(db: firestore.Client, day: str, sketches: Dict[str, SpaceSaving]) -> None:
+    """Merge one day's pending sketches into its stored document"""
+    ref = db.collection(TOPK_COLLECTION).document(day)
+
+    @firestore.transactional
+    def merge_into(transaction):
+        snapshot = ref.get(transaction=transaction)
+        stored = (snapshot.to_dict() or {}) if snapshot.exists else {}
+        transaction.set(ref, {
+            dimension: SpaceSaving.from_list(stored.get(dimension), sketch.capacity)
+                       .merge(sketch).to_list()
+            for dimension, sketch in sketches.items()
+        }, merge=True)
+
+    merge_into(db.transaction())
+
+
+def load_days(db: firestore.Client, days: Iterable[str], capacity: int = 100) -> Dict[str, SpaceSaving]:
+    """Stored sketches for the given days, merged per dimension"""
+    refs = [db.collection(TOPK_COLLECTION).document(day) for day in days]
+    merged = {dimension: SpaceSaving(capacity) for dimension in DIMENSIONS}
+    for snapshot in db.get_all(refs):
+        if not snapshot.exists:
+            continue
+        stored = snapshot.to_dict() or {}
+        for dimension in DIMENSIONS:
+            if stored.get(dimension):
+                merged[dimension] = merged[dimension].merge(
+                    SpaceSaving.from_list(stored[dimension], capacity)
+                )
+    return merged
@@ -1,12 +1,165 @@
-from fastapi import FastAPI, HTTPException
+from collections import Counter
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from google.cloud import firestore
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Optional
+import asyncio
+import logging
 import os
 from pydantic import BaseModel
+from logging_config import RequestIdMiddleware, configure_logging
+from event_codec import (
+    USER_AGENTS_COLLECTION,
+    InternCache,
+    decode_event,
+    encode_event,
+    user_agent_key,
+)
+from heavy_hitters import DIMENSIONS, TopKTracker, load_days, store_day
+from rate_limit import AdaptiveSampler, TokenBucketLimiter
+from sharding import pick_shard, query_shards
+from timing import TimingMiddleware, debug_router, timed
+
+# Structured JSON logging (inline, or via a background thread with
+# LOG_HANDLER=queue); health-check access logs are sampled
+configure_logging("analytics-backend", sampled_paths=("/",))
+logger = logging.getLogger(__name__)
+
+# Firestore client is created on first use (or during warm-up) rather than at
+# import time, so the container can start listening before the gRPC channel
+# is set up.
+_db: Optional[firestore.Client] = None
+
+
+def get_db() -> firestore.Client:
+    """Return the shared Firestore client, creating it on first use"""
+    global _db
+    if _db is None:
+        _db = firestore.Client()
+    return _db
+
+
+def _warm_up_firestore():
+    """Create the client and issue one cheap read to open the gRPC channel"""
+    list(get_db().collection("portfolio_events").limit(1).stream())
+
+
+# Ingest limits for /api/track (rates are events per second, 0 disables).
+# Limiter state is in-memory and per instance, bounded by TRACK_LIMITER_MAX_KEYS.
+_limiter_max_keys = int(os.getenv("TRACK_LIMITER_MAX_KEYS", "10000"))
+session_limiter = TokenBucketLimiter(
+    rate=float(os.getenv("TRACK_SESSION_RATE", "2")),
+    burst=float(os.getenv("TRACK_SESSION_BURST", "20")),
+    max_keys=_limiter_max_keys,
+)
+ip_limiter = TokenBucketLimiter(
+    rate=float(os.getenv("TRACK_IP_RATE", "10")),
+    burst=float(os.getenv("TRACK_IP_BURST", "100")),
+    max_keys=_limiter_max_keys,
+)
+# Above this many events per second, events are sampled and carry sample_weight
+write_sampler = AdaptiveSampler(float(os.getenv("TRACK_SAMPLING_THRESHOLD", "0")))
+
+# Ingest counters, exposed at /api/track/stats
+ingest_counters = Counter()
+
+# User agents this instance has already interned into user_agents
+known_user_agents = InternCache()
+
+# Per-day top-K sketches for api_endpoint, page and error_message (see
+# heavy_hitters.py), flushed to Firestore every TOPK_FLUSH_SECONDS
+TOPK_CAPACITY = int(os.getenv("TOPK_CAPACITY", "100"))
+TOPK_FLUSH_SECONDS = float(os.getenv("TOPK_FLUSH_SECONDS", "60"))
+topk_tracker = TopKTracker(TOPK_CAPACITY)
+
+
+async def flush_topk():
+    """Merge pending top-K sketches into their stored days; kept for retry on failure"""
+    drained = topk_tracker.drain()
+    if not drained:
+        return
+    try:
+        db = get_db()
+        for day, sketches in list(drained.items()):
+            # Cancelling cannot stop a store already running in its thread, so
+            # wait for it and keep its day only if it did not commit
+            store = asyncio.ensure_future(run_in_threadpool(store_day, db, day, sketches))
+            try:
+                await asyncio.shield(store)
+            except asyncio.CancelledError:
+                await asyncio.wait([store])
+                if store.exception() is None:
+                    del drained[day]
+                raise
+            del drained[day]
+    except Exception as e:
+        logger.warning("Top-K flush failed", extra={"error": str(e)})
+    finally:
+        # Days not stored yet (error or cancellation) go back for the next flush
+        topk_tracker.restore(drained)
+
+
+async def _flush_topk_periodically():
+    while True:
+        await asyncio.sleep(TOPK_FLUSH_SECONDS)
+        await flush_topk()
 
-app = FastAPI(title="Portfolio Analytics API")
+
+# Proxies in front of the service that append to X-Forwarded-For (Cloud Run's
+# front end is one; add one for an external load balancer). 0 ignores the header.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+
+
+def _client_ip(request: Request) -> str:
+    """
+    Client IP as seen by the outermost trusted proxy
+
+    Clients can send their own X-Forwarded-For and proxies append to it, so only
+    the hop added by the first trusted proxy (TRUSTED_PROXY_HOPS from the end)
+    is used; earlier entries are client-controlled.
+    """
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and TRUSTED_PROXY_HOPS > 0:
+        hops = [hop.strip() for hop in forwarded.split(",")]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _db
+
+    # Opt-in warm-up: pays the connection cost before the first request.
+    # Pair with a Cloud Run startup probe so traffic waits for it.
+    if os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes"):
+        try:
+            await run_in_threadpool(_warm_up_firestore)
+        except Exception as e:
+            logger.warning("Firestore warm-up failed", extra={"error": str(e)})
+
+    flusher = asyncio.create_task(_flush_topk_periodically())
+
+    yield
+
+    # Stop the periodic flush (it restores anything it had not stored), then
+    # flush everything still pending
+    flusher.cancel()
+    try:
+        await flusher
+    except asyncio.CancelledError:
+        pass
+    await flush_topk()
+
+    if _db is not None:
+        _db.close()
+        _db = None
+
+
+app = FastAPI(title="Portfolio Analytics API", lifespan=lifespan)
 
 # CORS configuration - allow requests from portfolio frontend
 app.add_middleware(
@@ -20,8 +173,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Firestore client
-db = firestore.Client()
+# Per-request Server-Timing breakdown, slow-request capture and profiling
+app.add_middleware(TimingMiddleware)
+
+# Tag every request (and its log lines) with a request ID
+app.add_middleware(RequestIdMiddleware)
+
+# Protected /debug endpoints (timings, profiler); disabled unless DEBUG_TOKEN is set
+app.include_router(debug_router)
 
 # Event model for request validation
 class TrackEvent(BaseModel):
@@ -35,6 +194,34 @@ class TrackEvent(BaseModel):
     session_id: Optional[str] = None
     user_agent: Optional[str] = None
 
+def build_event_document(event: TrackEvent, sample_weight: float = 1.0) -> dict:
+    """Build the compact Firestore document stored for a tracked event (see event_codec.py)"""
+    return encode_event({
+        "event_type": event.event_type,
+        "timestamp": firestore.SERVER_TIMESTAMP,
+        # Random shard prefix spreads index writes (see sharding.py)
+        "shard": pick_shard(),
+        # Weight is only stored for sampled events; a missing weight means 1
+        "sample_weight": sample_weight if sample_weight != 1.0 else None,
+        "page": event.page or None,
+        "demo_name": event.demo_name or None,
+        "api_endpoint": event.api_endpoint or None,
+        "api_method": event.api_method or None,
+        "success": event.success,
+        "error_message": event.error_message or None,
+        "session_id": event.session_id or None,
+        "user_agent_hash": user_agent_key(event.user_agent) if event.user_agent else None,
+    })
+
+_EPOCH = datetime.fromtimestamp(0, timezone.utc)
+
+def _timestamp(snapshot) -> datetime:
+    """Merge key for sharded queries"""
+    try:
+        return snapshot.get("ts") or _EPOCH
+    except KeyError:
+        return _EPOCH
+
 @app.get("/")
 async def health_check():
     """Health check endpoint"""
@@ -45,10 +232,14 @@ async def health_check():
     }
 
 @app.post("/api/track")
-async def track_event(event: TrackEvent):
+async def track_event(event: TrackEvent, request: Request):
     """
     Track a portfolio event (page view, API call, demo interaction, etc.)
 
+    Events are rate limited per session and per client IP (429 when exceeded).
+    Under heavy load events may be sampled: dropped events return
+    status "sampled_out", kept ones are stored with a sample_weight.
+
     Example request body:
     {
         "event_type": "api_call",
@@ -60,46 +251,98 @@ async def track_event(event: TrackEvent):
         "user_agent": "Mozilla/5.0..."
     }
     """
-    try:
-        # Create event document
-        event_data = {
-            "event_type": event.event_type,
-            "timestamp": firestore.SERVER_TIMESTAMP,
-            "created_at": datetime.utcnow().isoformat(),
+    ingest_counters["received"] += 1
+
+    if not ip_limiter.allow(_client_ip(request)):
+        ingest_counters["dropped_ip_rate_limit"] += 1
+        raise HTTPException(status_code=429, detail="Too many events from this client")
+    if event.session_id and not session_limiter.allow(event.session_id):
+        ingest_counters["dropped_session_rate_limit"] += 1
+        raise HTTPException(status_code=429, detail="Too many events for this session")
+
+    sample_weight = write_sampler.sample()
+    if sample_weight is None:
+        ingest_counters["sampled_out"] += 1
+        return {
+            "status": "sampled_out",
+            "event_id": None,
+            "message": "Event not stored due to load sampling"
         }
 
-        # Add optional fields if provided
-        if event.page:
-            event_data["page"] = event.page
-        if event.demo_name:
-            event_data["demo_name"] = event.demo_name
-        if event.api_endpoint:
-            event_data["api_endpoint"] = event.api_endpoint
-        if event.api_method:
-            event_data["api_method"] = event.api_method
-        if event.success is not None:
-            event_data["success"] = event.success
-        if event.error_message:
-            event_data["error_message"] = event.error_message
-        if event.session_id:
-            event_data["session_id"] = event.session_id
-        if event.user_agent:
-            event_data["user_agent"] = event.user_agent
-
-        # Store in Firestore
-        doc_ref = db.collection("portfolio_events").add(event_data)
+    if sample_weight != 1.0:
+        ingest_counters["sampled_in"] += 1
+
+    try:
+        # Create event document
+        event_data = build_event_document(event, sample_weight)
+
+        # Store in Firestore. A user agent this instance has not seen yet is
+        # interned in the same batch, so each one is stored once by hash.
+        db = get_db()
+        with timed("firestore_write"):
+            ua_key = event_data.get("ua")
+            if ua_key and ua_key not in known_user_agents:
+                batch = db.batch()
+                batch.set(
+                    db.collection(USER_AGENTS_COLLECTION).document(ua_key),
+                    {"ua": event.user_agent}
+                )
+                doc_ref = db.collection("portfolio_events").document()
+                batch.set(doc_ref, event_data)
+                batch.commit()
+                known_user_agents.add(ua_key)
+            else:
+                doc_ref = db.collection("portfolio_events").add(event_data)[1]
+        ingest_counters["stored"] += 1
+
+        day = datetime.now(timezone.utc).date().isoformat()
+        for dimension in DIMENSIONS:
+            topk_tracker.record(day, dimension, getattr(event, dimension), sample_weight)
 
         return {
             "status": "success",
-            "event_id": doc_ref[1].id,
+            "event_id": doc_ref.id,
             "message": "Event tracked successfully"
         }
 
     except Exception as e:
+        ingest_counters["write_errors"] += 1
         raise HTTPException(status_code=500, detail=f"Failed to track event: {str(e)}")
 
+@app.get("/api/track/stats")
+async def get_ingest_stats():
+    """
+    Ingest counters for this instance since startup
+
+    Returns received/stored counts, events dropped by the session and IP rate
+    limiters, and events sampled in or out by the adaptive sampler.
+    """
+    return {
+        "status": "success",
+        "counters": {
+            name: ingest_counters[name]
+            for name in (
+                "received",
+                "stored",
+                "dropped_ip_rate_limit",
+                "dropped_session_rate_limit",
+                "sampled_in",
+                "sampled_out",
+                "write_errors",
+            )
+        },
+        "sampling": {
+            "threshold_per_sec": write_sampler.threshold,
+            "current_rate_per_sec": round(write_sampler.current_rate(), 2),
+        },
+        "tracked_keys": {
+            "sessions": len(session_limiter),
+            "ips": len(ip_limiter),
+        },
+    }
+
 @app.get("/api/analytics/summary")
-async def get_analytics_summary():
+async def get_analytics_summary(top_n: Annotated[int, Query(ge=1, le=50)] = 5):
     """
     Get aggregated analytics for the portfolio (last 30 days)
 
@@ -110,18 +353,43 @@ async def get_analytics_summary():
     - Unique visitors (by session_id)
     - Popular demos
     - Recent activity timeline
+    - Top top_n API endpoints, pages and error messages, from the daily
+      top-K sketches. "count" may overestimate by at most "max_overcount".
     """
     try:
         # Calculate 30 days ago
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-
-        # Query events from last 30 days
-        events_ref = db.collection("portfolio_events")
-        query = events_ref.where("created_at", ">=", thirty_days_ago.isoformat())
-        events = list(query.stream())
-
-        # Initialize counters
-        total_events = len(events)
+        thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
+
+        # Query events from last 30 days, one query per shard
+        events_ref = get_db().collection("portfolio_events")
+        with timed("firestore_query"):
+            events = await run_in_threadpool(
+                query_shards,
+                events_ref,
+                lambda q: q.where("ts", ">=", thirty_days_ago)
+                           .order_by("ts", direction=firestore.Query.DESCENDING),
+                _timestamp,
+            )
+
+        # Daily top-K sketches for the same window, plus this instance's
+        # unflushed ones
+        today = datetime.now(timezone.utc).date()
+        days = [(today - timedelta(days=i)).isoformat() for i in range(30)]
+        with timed("firestore_topk"):
+            top_k = await run_in_threadpool(load_days, get_db(), days, TOPK_CAPACITY)
+        for day in days:
+            for dimension, sketch in topk_tracker.pending.get(day, {}).items():
+                top_k[dimension] = top_k[dimension].merge(sketch)
+
+        def top_list(dimension):
+            return [
+                {"name": value, "count": round(count), "max_overcount": round(error)}
+                for value, count, error in top_k[dimension].top(top_n)
+            ]
+
+        # Initialize counters. Sampled events carry sample_weight, so every
+        # count below is a weighted sum (unsampled events weigh 1).
+        total_events = 0.0
         api_calls = 0
         api_successes = 0
         unique_sessions = set()
@@ -131,26 +399,28 @@ async def get_analytics_summary():
 
         # Process events
         for event in events:
-            event_data = event.to_dict()
+            event_data = decode_event(event.to_dict())
+            weight = event_data.get("sample_weight", 1)
+            total_events += weight
 
             # Count by event type
             if event_data.get("event_type") == "api_call":
-                api_calls += 1
+                api_calls += weight
                 if event_data.get("success") is True:
-                    api_successes += 1
+                    api_successes += weight
 
             elif event_data.get("event_type") == "page_view":
-                page_views += 1
+                page_views += weight
 
             elif event_data.get("event_type") == "demo_viewed":
                 demo_name = event_data.get("demo_name")
                 if demo_name:
-                    demo_views[demo_name] = demo_views.get(demo_name, 0) + 1
+                    demo_views[demo_name] = demo_views.get(demo_name, 0) + weight
 
             elif event_data.get("event_type") == "demo_clicked":
                 demo_name = event_data.get("demo_name")
                 if demo_name:
-                    demo_clicks[demo_name] = demo_clicks.get(demo_name, 0) + 1
+                    demo_clicks[demo_name] = demo_clicks.get(demo_name, 0) + weight
 
             # Track unique sessions
             if event_data.get("session_id"):
@@ -166,9 +436,9 @@ async def get_analytics_summary():
             clicks = demo_clicks.get(demo, 0)
             popular_demos[demo] = {
                 'name': demo,
-                'views': views,
-                'clicks': clicks,
-                'total_interactions': views + clicks
+                'views': round(views),
+                'clicks': round(clicks),
+                'total_interactions': round(views + clicks)
             }
 
         # Sort by total interactions
@@ -182,12 +452,15 @@ async def get_analytics_summary():
             "status": "success",
             "period": "last_30_days",
             "data": {
-                "total_events": total_events,
-                "api_calls": api_calls,
+                "total_events": round(total_events),
+                "api_calls": round(api_calls),
                 "api_success_rate": api_success_rate,
                 "unique_visitors": len(unique_sessions),
-                "page_views": page_views,
+                "page_views": round(page_views),
                 "popular_demos": popular_demos_sorted,
+                "top_api_endpoints": top_list("api_endpoint"),
+                "top_pages": top_list("page"),
+                "top_errors": top_list("error_message"),
             }
         }
 
@@ -202,15 +475,21 @@ async def get_realtime_activity():
     Returns a chronological feed of recent portfolio events
     """
     try:
-        # Query last 20 events, ordered by timestamp
-        events_ref = db.collection("portfolio_events")
-        query = events_ref.order_by("created_at", direction=firestore.Query.DESCENDING).limit(20)
-        events = list(query.stream())
+        # Query last 20 events per shard and merge, newest first
+        events_ref = get_db().collection("portfolio_events")
+        with timed("firestore_query"):
+            events = await run_in_threadpool(
+                query_shards,
+                events_ref,
+                lambda q: q.order_by("ts", direction=firestore.Query.DESCENDING),
+                _timestamp,
+                20,
+            )
 
         # Format events for response
         activity_feed = []
         for event in events:
-            event_data = event.to_dict()
+            event_data = decode_event(event.to_dict())
             activity_feed.append({
                 "event_id": event.id,
                 "event_type": event_data.get("event_type"),
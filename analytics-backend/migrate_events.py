@@ -0,0 +1,88 @@
+"""
+One-off migration: rewrite portfolio_events documents written before the
+compact encoding (long field names, full user agent, created_at string, no
+shard) into the compact form from event_codec.py, interning user agents.
+
+The sharded queries in main.py only find migrated documents. Run this once
+after the (sh, ts) composite index is ready and the new backend is deployed,
+and before applying the index exemptions in firestore.indexes.json (see
+DEPLOYMENT.md):
+
+    cd analytics-backend
+    python migrate_events.py [--dry-run]
+"""
+import argparse
+from datetime import datetime, timezone
+
+from google.cloud import firestore
+
+from event_codec import USER_AGENTS_COLLECTION, encode_event, user_agent_key
+from sharding import pick_shard
+
+BATCH_SIZE = 500  # Firestore's maximum writes per batch
+
+LEGACY_FIELDS = (
+    "event_type", "sample_weight", "page", "demo_name", "api_endpoint",
+    "api_method", "success", "error_message", "session_id",
+)
+
+
+def compact_from_legacy(legacy: dict) -> dict:
+    """Compact document for a legacy event"""
+    fields = {name: legacy.get(name) for name in LEGACY_FIELDS}
+    timestamp = legacy.get("timestamp")
+    if timestamp is None and legacy.get("created_at"):
+        timestamp = datetime.fromisoformat(legacy["created_at"]).replace(tzinfo=timezone.utc)
+    fields["timestamp"] = timestamp
+    fields["shard"] = legacy["shard"] if "shard" in legacy else pick_shard()
+    if legacy.get("user_agent"):
+        fields["user_agent_hash"] = user_agent_key(legacy["user_agent"])
+    return encode_event(fields)
+
+
+def migrate(db: firestore.Client, dry_run: bool = False) -> int:
+    migrated = 0
+    interned = set()
+    batch = db.batch()
+    pending = 0
+
+    def flush_if_full():
+        nonlocal batch, pending
+        if pending >= BATCH_SIZE - 1:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    for doc in db.collection("portfolio_events").stream():
+        legacy = doc.to_dict() or {}
+        if "t" in legacy:
+            continue
+        migrated += 1
+        if dry_run:
+            continue
+
+        compact = compact_from_legacy(legacy)
+        ua_key = compact.get("ua")
+        if ua_key and ua_key not in interned:
+            batch.set(
+                db.collection(USER_AGENTS_COLLECTION).document(ua_key),
+                {"ua": legacy["user_agent"]}
+            )
+            interned.add(ua_key)
+            pending += 1
+        batch.set(doc.reference, compact)
+        pending += 1
+        flush_if_full()
+
+    if pending:
+        batch.commit()
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert legacy portfolio_events to the compact encoding")
+    parser.add_argument("--dry-run", action="store_true", help="Only count documents")
+    args = parser.parse_args()
+
+    count = migrate(firestore.Client(), dry_run=args.dry_run)
+    print(f"{'Would migrate' if args.dry_run else 'Migrated'} {count} documents")
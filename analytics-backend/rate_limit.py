@@ -0,0 +1,106 @@
+"""
+Ingest-side protection for /api/track.
+
+- TokenBucketLimiter: per-key token buckets (session ID, client IP) held in a
+  fixed-size LRU so memory stays bounded no matter how many keys we see.
+- AdaptiveSampler: once the offered write rate exceeds a threshold, keeps
+  each event with probability threshold / rate and reports the inverse of that
+  probability as the event's sample weight, so weighted counts stay unbiased.
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class TokenBucketLimiter:
+    """Token bucket per key with LRU eviction once max_keys is reached"""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: str, now: Optional[float] = None) -> bool:
+        """Consume one token for key; return False if the bucket is empty"""
+        if self.rate <= 0:
+            return True
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # New keys start with a full bucket
+                bucket = [self.burst, now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                tokens, last = bucket
+                bucket[0] = min(self.burst, tokens + (now - last) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] < 1:
+                return False
+            bucket[0] -= 1
+            return True
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class AdaptiveSampler:
+    """Probabilistic sampler that engages when the arrival rate exceeds a threshold"""
+
+    def __init__(
+        self,
+        threshold_per_sec: float,
+        window_seconds: float = 1.0,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.threshold = threshold_per_sec
+        self.window = window_seconds
+        self._rng = rng
+        self._window_start: Optional[float] = None
+        self._window_count = 0
+        self._last_rate = 0.0
+        self._lock = threading.Lock()
+
+    def current_rate(self) -> float:
+        """Estimated arrivals per second (previous window, or current if higher)"""
+        return max(self._last_rate, self._window_count / self.window)
+
+    def sample(self, now: Optional[float] = None) -> Optional[float]:
+        """
+        Record one arrival and decide whether to keep it.
+
+        Returns the sample weight (1.0 when sampling is not engaged) for kept
+        events, or None if the event should be dropped.
+        """
+        if self.threshold <= 0:
+            return 1.0
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            if self._window_start is None:
+                self._window_start = now
+            elapsed = now - self._window_start
+            if elapsed >= self.window:
+                self._last_rate = self._window_count / elapsed
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            rate = self.current_rate()
+
+        if rate <= self.threshold:
+            return 1.0
+        probability = self.threshold / rate
+        if self._rng() < probability:
+            return 1.0 / probability
+        return None
@@ -0,0 +1,60 @@
+"""
+Shard-prefixed, time-ordered queries over portfolio_events.
+
+Firestore limits sustained writes to an index over monotonically increasing
+values (like the event timestamp) to roughly 500/s, because every new entry
+lands at the end of the same key range. Each event therefore gets a random
+shard (stored as ``sh``) in [0, EVENT_SHARDS), time-ordered queries use the
+composite index (sh ASC, ts DESC) declared in firestore.indexes.json, and the
+single-field index on ts is exempted. Writes spread across
+EVENT_SHARDS key ranges; reads fan out one query per shard and merge.
+
+EVENT_SHARDS may be increased but never decreased, or events in the removed
+shards stop being returned.
+"""
+import heapq
+import itertools
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+EVENT_SHARDS = int(os.getenv("EVENT_SHARDS", "10"))
+SHARD_FIELD = "sh"  # compact key, see event_codec.FIELD_KEYS
+
+_executor = ThreadPoolExecutor(max_workers=EVENT_SHARDS, thread_name_prefix="shard-query")
+
+
+def pick_shard() -> int:
+    """Random shard for a new document"""
+    return random.randrange(EVENT_SHARDS)
+
+
+def query_shards(
+    collection,
+    build_query: Callable[[Any], Any],
+    sort_key: Callable[[Any], Any],
+    limit: Optional[int] = None,
+) -> List[Any]:
+    """
+    Run one query per shard in parallel and merge the results newest first.
+
+    Args:
+        collection: Firestore collection reference
+        build_query: Adds filters/ordering to a shard-filtered query. Each
+            shard's results must already be sorted descending by sort_key.
+        sort_key: Key for merging snapshots across shards (e.g. the timestamp)
+        limit: Maximum number of merged results; also applied per shard
+
+    Returns:
+        Document snapshots from all shards, sorted descending by sort_key
+    """
+    def run(shard: int) -> List[Any]:
+        query = build_query(collection.where(SHARD_FIELD, "==", shard))
+        if limit is not None:
+            query = query.limit(limit)
+        return list(query.stream())
+
+    per_shard = list(_executor.map(run, range(EVENT_SHARDS)))
+    merged = heapq.merge(*per_shard, key=sort_key, reverse=True)
+    return list(itertools.islice(merged, limit))
@@ -0,0 +1,222 @@
+"""
+Compare the legacy and compact portfolio_events encodings.
+
+For a synthetic 30-day event mix it reports, per encoding:
+
+- storage size per document, using Firestore's documented size rules
+  (field names and strings are UTF-8 bytes + 1, numbers and timestamps 8,
+  booleans 1, plus the document name and 32 bytes overhead)
+- wire size per document, as the serialized Firestore Document protobuf
+- summary scan time: get_analytics_summary() run against an in-memory
+  collection that deserializes each document's protobuf as it is streamed,
+  the way the client library does
+
+Network transfer time is not modeled. On Firestore it scales with the wire
+bytes reported here.
+
+Usage:
+    python benchmarks/event_encoding.py [--events 20000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "analytics-backend"))
+
+from google.cloud.firestore_v1 import _helpers  # noqa: E402
+from google.cloud.firestore_v1.types import document as document_pb  # noqa: E402
+
+import main  # noqa: E402
+import sharding  # noqa: E402
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+    "Version/17.1 Mobile/15E148 Safari/604.1",
+]
+DEMOS = ["API Explorer", "GCP Architecture", "Stripe Integration"]
+DOC_ID_LENGTH = 20
+
+
+def random_event():
+    event_type = random.choices(
+        ["page_view", "demo_viewed", "demo_clicked", "api_call", "page_exit"],
+        weights=[40, 20, 10, 20, 10],
+    )[0]
+    fields = {
+        "event_type": event_type,
+        "page": random.choice(["/", "/about", "/demos/api-explorer", "/demos/stripe"]),
+        "session_id": f"session_{random.getrandbits(40)}_{random.getrandbits(30):x}",
+        "user_agent": random.choice(USER_AGENTS),
+    }
+    if event_type.startswith("demo") or event_type == "api_call":
+        fields["demo_name"] = random.choice(DEMOS)
+    if event_type == "api_call":
+        fields["api_endpoint"] = "https://api.github.com/users/github"
+        fields["api_method"] = "GET"
+        fields["success"] = random.random() < 0.95
+    return main.TrackEvent(**fields)
+
+
+def legacy_document(event, when):
+    """Document as track_event stored it before the compact encoding."""
+    doc = {
+        "event_type": event.event_type,
+        "timestamp": when,
+        "created_at": when.replace(tzinfo=None).isoformat(),
+        "shard": sharding.pick_shard(),
+    }
+    for name in ("page", "demo_name", "api_endpoint", "api_method", "success",
+                 "error_message", "session_id", "user_agent"):
+        value = getattr(event, name)
+        if value is not None:
+            doc[name] = value
+    return doc
+
+
+def compact_document(event, when):
+    doc = main.build_event_document(event)
+    doc["ts"] = when
+    return doc
+
+
+def storage_size(value):
+    """Firestore storage size of a value (documented size rules)."""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, dict):
+        return sum(storage_size(k) + storage_size(v) for k, v in value.items())
+    raise TypeError(type(value))
+
+
+def document_size(doc, collection="portfolio_events"):
+    name_size = storage_size(collection) + storage_size("x" * DOC_ID_LENGTH) + 16
+    return name_size + storage_size(doc) + 32
+
+
+class Snapshot:
+    """Streams like a DocumentSnapshot: fields are decoded from protobuf on read."""
+
+    def __init__(self, doc_id, payload):
+        self.id = doc_id
+        self._data = _helpers.decode_dict(document_pb.Document.deserialize(payload).fields, None)
+
+    def to_dict(self):
+        return dict(self._data)
+
+    def get(self, field):
+        return self._data[field]
+
+
+class ShardQuery:
+    def __init__(self, payloads):
+        self.payloads = payloads
+
+    def where(self, *args):
+        return self
+
+    def order_by(self, *args, **kwargs):
+        return self
+
+    def limit(self, count):
+        return ShardQuery(self.payloads[:count])
+
+    def stream(self):
+        for doc_id, payload in self.payloads:
+            yield Snapshot(doc_id, payload)
+
+
+class Collection:
+    """Serves pre-serialized documents bucketed by shard."""
+
+    def __init__(self, shard_payloads):
+        self.shard_payloads = shard_payloads
+
+    def document(self, doc_id):
+        return doc_id
+
+    def where(self, field, op, value):
+        return ShardQuery(self.shard_payloads[value])
+
+
+class DB:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def collection(self, name):
+        return self._collection
+
+    def get_all(self, refs):
+        return []  # no stored top-K sketches
+
+
+def run_scan(docs):
+    """Serialize docs, then time get_analytics_summary over them."""
+    shard_payloads = {shard: [] for shard in range(sharding.EVENT_SHARDS)}
+    wire_sizes = []
+    for i, doc in enumerate(docs):
+        payload = document_pb.Document.serialize(
+            document_pb.Document(fields=_helpers.encode_dict(doc))
+        )
+        wire_sizes.append(len(payload))
+        shard = doc.get("sh", doc.get("shard"))
+        shard_payloads[shard].append((f"doc{i:016d}", payload))
+
+    main.get_db = lambda: DB(Collection(shard_payloads))
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        result = asyncio.run(main.get_analytics_summary())
+        timings.append(time.perf_counter() - start)
+    return result["data"], wire_sizes, min(timings)
+
+
+def main_(args):
+    now = datetime.now(timezone.utc)
+    events = [
+        (random_event(), now - timedelta(seconds=random.uniform(0, 30 * 86400)))
+        for _ in range(args.events)
+    ]
+    encodings = {
+        "legacy": [legacy_document(e, when) for e, when in events],
+        "compact": [compact_document(e, when) for e, when in events],
+    }
+
+    summaries = {}
+    print(f"{args.events} events")
+    print(f"{'encoding':<8} {'stored B/doc':>12} {'wire B/doc':>10} {'wire MB':>8} {'scan s':>7}")
+    for name, docs in encodings.items():
+        summary, wire_sizes, scan_s = run_scan(docs)
+        summaries[name] = summary
+        stored = statistics.mean(document_size(doc) for doc in docs)
+        print(
+            f"{name:<8} {stored:>12.1f} {statistics.mean(wire_sizes):>10.1f} "
+            f"{sum(wire_sizes) / 1e6:>8.2f} {scan_s:>7.3f}"
+        )
+
+    interned = {main.user_agent_key(ua): ua for ua in USER_AGENTS}
+    ua_bytes = sum(
+        document_size({"ua": ua}, main.USER_AGENTS_COLLECTION) for ua in interned.values()
+    )
+    print(f"user_agents collection: {len(interned)} docs, {ua_bytes} B total")
+    print("summaries identical:", summaries["legacy"] == summaries["compact"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=20000)
+    main_(parser.parse_args())
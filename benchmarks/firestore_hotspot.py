@@ -0,0 +1,152 @@
+"""
+Load test of portfolio_events write throughput against a local stand-in for
+Firestore's index storage, with and without shard prefixes.
+
+There is no Firestore emulator model of write hotspots, so this uses a small
+virtual-time model of how Firestore stores indexes:
+
+- Every indexed field produces ascending and descending index entries, and
+  each composite index one entry, all committed with the document.
+- Index entries live in key-range "tablets" that each sustain ~500 writes/s.
+- Entries whose leading value increases monotonically (the server
+  timestamp) always land in the last tablet of their index. Entries
+  led by a shard number land in that shard's range. Other values (random
+  doc IDs break ties) are assumed already split across many tablets.
+- A write completes when all of its index entries have been written.
+
+Documents come from analytics-backend's build_event_document(), and the
+index configuration comes from firestore.indexes.json, so the scenarios
+reflect the real schema:
+
+- unsharded: automatic single-field indexes on every field, no shard
+- sharded, no exemptions: shard field and composite index, but the
+  monotonic single-field indexes are still written
+- sharded + exemptions: firestore.indexes.json as deployed
+
+Usage:
+    python benchmarks/firestore_hotspot.py [--duration 10]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "analytics-backend"))
+
+import main  # noqa: E402
+from sharding import SHARD_FIELD  # noqa: E402
+
+TABLET_WRITES_PER_SEC = 500
+MONOTONIC_FIELDS = {"ts"}  # server timestamp (compact key)
+RANDOM_SPLITS = 64
+OFFERED_RATES = (250, 500, 1000, 2000, 4000)
+
+
+def load_index_config(collection="portfolio_events"):
+    with open(os.path.join(REPO_ROOT, "firestore.indexes.json")) as f:
+        config = json.load(f)
+    composites = [
+        [field["fieldPath"] for field in index["fields"]]
+        for index in config["indexes"]
+        if index["collectionGroup"] == collection
+    ]
+    exempt = {
+        override["fieldPath"]
+        for override in config["fieldOverrides"]
+        if override["collectionGroup"] == collection and not override["indexes"]
+    }
+    return composites, exempt
+
+
+def sample_document(sharded):
+    event = main.TrackEvent(
+        event_type=random.choice(["page_view", "api_call", "demo_viewed", "demo_clicked"]),
+        page="/demos/api-explorer",
+        demo_name="API Explorer",
+        api_endpoint="https://api.github.com/users/github",
+        api_method="GET",
+        success=True,
+        session_id=f"session_{random.getrandbits(40):x}",
+        user_agent="Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0",
+    )
+    doc = main.build_event_document(event)
+    if not sharded:
+        doc.pop(SHARD_FIELD)
+    return doc
+
+
+def tablet_for(index_name, leading_field, leading_value):
+    """Key-range tablet an index entry is written to."""
+    if leading_field in MONOTONIC_FIELDS:
+        return (index_name, "tail")
+    if leading_field == SHARD_FIELD:
+        return (index_name, leading_value)
+    return (index_name, random.randrange(RANDOM_SPLITS))
+
+
+def index_tablets(doc, composites, exempt):
+    tablets = []
+    for field, value in doc.items():
+        if field in exempt:
+            continue
+        for direction in ("asc", "desc"):
+            tablets.append(tablet_for(f"{field}:{direction}", field, value))
+    for fields in composites:
+        if all(f in doc for f in fields):
+            tablets.append(tablet_for("+".join(fields), fields[0], doc[fields[0]]))
+    return tablets
+
+
+def simulate(rate, duration, sharded, composites, exempt):
+    """Return (achieved writes/s, p50 ms, p99 ms) for an offered write rate."""
+    free_at = {}
+    service_time = 1.0 / TABLET_WRITES_PER_SEC
+    latencies = []
+    last_commit = 0.0
+    total = int(rate * duration)
+
+    for i in range(total):
+        arrival = i / rate
+        commit = arrival
+        for tablet in index_tablets(sample_document(sharded), composites, exempt):
+            start = max(arrival, free_at.get(tablet, 0.0))
+            free_at[tablet] = start + service_time
+            commit = max(commit, start + service_time)
+        latencies.append((commit - arrival) * 1000)
+        last_commit = max(last_commit, commit)
+
+    latencies.sort()
+    return (
+        total / last_commit,
+        statistics.median(latencies),
+        latencies[int(len(latencies) * 0.99) - 1],
+    )
+
+
+def main_(args):
+    composites, exempt = load_index_config()
+    scenarios = [
+        ("unsharded", False, [], set()),
+        ("sharded, no exemptions", True, composites, set()),
+        ("sharded + exemptions", True, composites, exempt),
+    ]
+
+    print(f"shards={os.getenv('EVENT_SHARDS', '10')} tablet capacity={TABLET_WRITES_PER_SEC}/s "
+          f"duration={args.duration}s")
+    print(f"{'scenario':<24} {'offered/s':>9} {'achieved/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, sharded, scenario_composites, scenario_exempt in scenarios:
+        for rate in OFFERED_RATES:
+            achieved, p50, p99 = simulate(
+                rate, args.duration, sharded, scenario_composites, scenario_exempt
+            )
+            print(f"{name:<24} {rate:>9} {achieved:>10.0f} {p50:>9.1f} {p99:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=10)
+    main_(parser.parse_args())
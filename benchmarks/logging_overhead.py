@@ -0,0 +1,190 @@
+"""
+Measure per-request logging overhead on the event loop.
+
+Drives a minimal FastAPI app in-process (no network) whose endpoint logs two
+lines per request, the way create_payment_intent does, under four setups:
+
+- none: logging disabled, the baseline
+- basic: logging.basicConfig with f-string messages (before structured logging)
+- json-sync: configure_logging(handler="sync"), JSON written on the event loop
+- json-queue: configure_logging(handler="queue"), QueueHandler + listener thread
+
+Output goes to a pipe drained by a reader thread, like a container's stderr.
+Each setup runs once per --sink-latency-us value; every write blocks for that
+long (0 is a fast pipe, larger values a backpressured one). With a fast sink
+the queue costs more than writing inline (JSON formatting on the listener
+thread competes for the GIL and shows up in p99); once writes block, only the
+inline setups stall the event loop. The break-even latency printed at the end
+(lowest tested latency where the queue wins on both mean and p99) is where
+LOG_HANDLER=queue starts paying off. time.sleep cannot block for only a few
+microseconds, so the measured block time per write is printed as well.
+
+Usage:
+    python benchmarks/logging_overhead.py [--requests 5000] [--sink-latency-us 0 20 50 100 500]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "stripe-backend"))
+
+from fastapi import FastAPI  # noqa: E402
+
+import logging_config  # noqa: E402
+
+
+def make_app(structured):
+    app = FastAPI()
+    app.add_middleware(logging_config.RequestIdMiddleware)
+    logger = logging.getLogger("bench")
+
+    @app.get("/pay/{order_id}")
+    async def pay(order_id: str):
+        if structured:
+            logger.info("Creating payment intent", extra={"order_id": order_id, "amount": 2999})
+            logger.info("Payment intent created successfully", extra={"order_id": order_id})
+        else:
+            logger.info(f"Creating payment intent for order {order_id}: $29.99 USD")
+            logger.info(f"Payment intent created successfully: pi_{order_id}")
+        return {"ok": True}
+
+    return app
+
+
+class SlowSink:
+    """Text stream wrapper whose writes block for a fixed time."""
+
+    def __init__(self, stream, latency_s):
+        self.stream = stream
+        self.latency_s = latency_s
+        self.blocked_s = 0.0
+        self.writes = 0
+
+    def write(self, text):
+        # time.sleep overshoots short intervals, so record how long it blocked
+        start = time.perf_counter()
+        time.sleep(self.latency_s)
+        self.blocked_s += time.perf_counter() - start
+        self.writes += 1
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def open_sink(latency_us=0):
+    """Pipe whose read end is drained by a background thread."""
+    read_fd, write_fd = os.pipe()
+
+    def drain():
+        with os.fdopen(read_fd, "rb") as reader:
+            while reader.read(65536):
+                pass
+
+    threading.Thread(target=drain, daemon=True).start()
+    stream = os.fdopen(write_fd, "w", buffering=1)
+    return SlowSink(stream, latency_us / 1e6) if latency_us else stream
+
+
+def configure(mode, sink):
+    root = logging.getLogger()
+    root.handlers = []
+    logging.disable(logging.NOTSET)
+    if mode == "none":
+        logging.disable(logging.CRITICAL)
+    elif mode == "basic":
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            stream=sink,
+            force=True,
+        )
+    else:
+        handler = mode.split("-", 1)[1]
+        logging_config.configure_logging("bench", stream=sink, handler=handler)
+
+
+async def drive(app, total):
+    """Call the ASGI app directly and return per-request latencies in µs."""
+    latencies = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for i in range(total):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": f"/pay/{i}",
+            "raw_path": f"/pay/{i}".encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [],
+            "client": ("127.0.0.1", 1234),
+            "server": ("127.0.0.1", 8000),
+        }
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def run(total, sink_latency_us):
+    sink = open_sink(sink_latency_us)
+    results = {}
+    for mode in ("none", "basic", "json-sync", "json-queue"):
+        configure(mode, sink)
+        app = make_app(structured=mode.startswith("json"))
+        asyncio.run(drive(app, 200))  # warm up
+        latencies = sorted(asyncio.run(drive(app, total)))
+        results[mode] = latencies
+        logging_config.shutdown_logging()
+
+    baseline = statistics.mean(results["none"])
+    measured = f" (measured {sink.blocked_s / sink.writes * 1e6:.0f})" if sink_latency_us else ""
+    print(f"\nsink latency {sink_latency_us:.0f} µs/write{measured}")
+    print(f"{'mode':<10} {'mean µs':>9} {'p50 µs':>9} {'p99 µs':>9} {'overhead µs':>12}")
+    for mode, latencies in results.items():
+        mean = statistics.mean(latencies)
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(
+            f"{mode:<10} {mean:>9.1f} {statistics.median(latencies):>9.1f} "
+            f"{p99:>9.1f} {mean - baseline:>12.1f}"
+        )
+    return {
+        mode: (statistics.mean(results[mode]), results[mode][int(len(results[mode]) * 0.99) - 1])
+        for mode in ("json-sync", "json-queue")
+    }
+
+
+def main(args):
+    break_even = None
+    for latency_us in sorted(args.sink_latency_us):
+        summary = run(args.requests, latency_us)
+        (sync_mean, sync_p99), (queue_mean, queue_p99) = summary["json-sync"], summary["json-queue"]
+        if break_even is None and queue_mean < sync_mean and queue_p99 < sync_p99:
+            break_even = latency_us
+    if break_even is None:
+        print("\njson-queue did not beat json-sync (mean and p99) at any tested sink latency")
+    else:
+        print(f"\njson-queue beats json-sync (mean and p99) from {break_even:.0f} µs/write")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--sink-latency-us", type=float, nargs="+", default=[0, 20, 50, 100, 500])
+    main(parser.parse_args())
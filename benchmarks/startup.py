@@ -0,0 +1,149 @@
+"""
+Cold-start benchmark for the Python services.
+
+Measures two things for each service and compares them against a budget:
+
+- Import time: cumulative time to import ``main`` as reported by
+  ``python -X importtime``.
+- Time to first response: wall time from launching uvicorn until the health
+  endpoint returns 200.
+
+Usage:
+    python benchmarks/startup.py                     # all services
+    python benchmarks/startup.py analytics-backend   # a single service
+
+Exits non-zero if any measurement exceeds its budget.
+"""
+
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets in milliseconds, measured on a developer laptop. Cloud Run instances
+# are slower, so these are deliberately tight relative to production.
+SERVICES = {
+    "analytics-backend": {
+        "health_path": "/",
+        "import_budget_ms": 1500,
+        "first_response_budget_ms": 3000,
+    },
+    "saas-starter-api": {
+        "health_path": "/",
+        "import_budget_ms": 1500,
+        "first_response_budget_ms": 3000,
+    },
+    "stripe-backend": {
+        "health_path": "/health",
+        "import_budget_ms": 1000,
+        "first_response_budget_ms": 2500,
+        # Dummy key so configure_stripe() passes; no Stripe calls are made
+        "env": {"STRIPE_SECRET_KEY": "sk_test_startup_benchmark"},
+    },
+}
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def _service_env(config):
+    env = dict(os.environ)
+    env.update(config.get("env", {}))
+    # Never let the benchmark reach real GCP services
+    env.setdefault("GOOGLE_CLOUD_PROJECT", "startup-benchmark")
+    env["WARMUP_ON_STARTUP"] = "false"
+    return env
+
+
+def measure_import_ms(service, config):
+    """Return the cumulative import time of the service's main module in ms."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=os.path.join(REPO_ROOT, service),
+        env=_service_env(config),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {service}/main.py failed:\n{result.stderr}")
+
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and match.group(3) == "main":
+            return int(match.group(2)) / 1000
+    raise RuntimeError(f"No importtime entry for main in {service}")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_response_ms(service, config, timeout=30.0):
+    """Return ms from process launch until the health endpoint answers 200."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}{config['health_path']}"
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.join(REPO_ROOT, service),
+        env=_service_env(config),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(
+                    f"{service} exited during startup:\n{proc.stderr.read().decode()}"
+                )
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError(f"{service} did not respond within {timeout}s")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main(argv):
+    services = argv or list(SERVICES)
+    failures = []
+
+    print(f"{'service':<20} {'import ms':>10} {'budget':>8} {'first resp ms':>14} {'budget':>8}")
+    for service in services:
+        config = SERVICES[service]
+        import_ms = measure_import_ms(service, config)
+        first_ms = measure_first_response_ms(service, config)
+        print(
+            f"{service:<20} {import_ms:>10.1f} {config['import_budget_ms']:>8} "
+            f"{first_ms:>14.1f} {config['first_response_budget_ms']:>8}"
+        )
+        if import_ms > config["import_budget_ms"]:
+            failures.append(f"{service}: import {import_ms:.0f}ms > {config['import_budget_ms']}ms")
+        if first_ms > config["first_response_budget_ms"]:
+            failures.append(
+                f"{service}: first response {first_ms:.0f}ms > {config['first_response_budget_ms']}ms"
+            )
+
+    for failure in failures:
+        print(f"OVER BUDGET - {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
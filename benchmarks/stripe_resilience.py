@@ -0,0 +1,224 @@
+"""
+Exercise the Stripe resilience layer against a local mock Stripe server.
+
+The mock server answers POST /v1/payment_intents with added latency and
+injects 429s: randomly (--error-rate) and whenever more than --capacity
+requests are in flight, the way a rate-limited account behaves.
+
+Three scenarios run against it:
+
+- direct: stripe.PaymentIntent.create with no client-side protection
+- resilient: the same calls through ResilientStripeClient
+- throttled: the resilient client while 60% of requests get a 429; calls
+  may run out of retries, but the circuit breaker must stay closed
+- outage: every request fails with a Stripe 500; the circuit breaker should
+  start failing fast (throttling alone must never open it)
+
+Usage:
+    python benchmarks/stripe_resilience.py [--requests 300] [--concurrency 40]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "stripe-backend"))
+
+import stripe  # noqa: E402
+from fastapi.concurrency import run_in_threadpool  # noqa: E402
+
+from resilience import (  # noqa: E402
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    OverloadedError,
+    ResilientStripeClient,
+)
+
+
+class MockStripeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency_ms, error_rate, capacity, outage=False):
+        super().__init__(("127.0.0.1", 0), MockStripeHandler)
+        self.outage = outage
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.served = 0
+        self.throttled = 0
+        self.failed = 0
+
+
+class MockStripeHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.in_flight += 1
+            over_capacity = server.in_flight > server.capacity
+        try:
+            time.sleep(random.uniform(0.5, 1.5) * server.latency_ms / 1000)
+            if server.outage:
+                with server.lock:
+                    server.failed += 1
+                self._send(500, {"error": {
+                    "type": "api_error",
+                    "message": "An unknown error occurred.",
+                }})
+                return
+            if over_capacity or random.random() < server.error_rate:
+                with server.lock:
+                    server.throttled += 1
+                self._send(429, {"error": {
+                    "type": "invalid_request_error",
+                    "code": "rate_limit",
+                    "message": "Too many requests hit the API too quickly.",
+                }})
+                return
+            with server.lock:
+                server.served += 1
+            intent_id = f"pi_mock_{random.getrandbits(48):x}"
+            self._send(200, {
+                "id": intent_id,
+                "object": "payment_intent",
+                "client_secret": f"{intent_id}_secret_mock",
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+def create_intent(**kwargs):
+    return stripe.PaymentIntent.create(
+        amount=2999,
+        currency="usd",
+        automatic_payment_methods={"enabled": True},
+        **kwargs,
+    )
+
+
+async def run_load(call, total, concurrency):
+    """Fire `total` calls with at most `concurrency` callers; collect outcomes."""
+    outcomes = {
+        "ok": 0, "rate_limited": 0, "server_error": 0, "overloaded": 0, "circuit_open": 0, "other": 0,
+    }
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call()
+                outcomes["ok"] += 1
+            except stripe.error.RateLimitError:
+                outcomes["rate_limited"] += 1
+            except stripe.error.APIError:
+                outcomes["server_error"] += 1
+            except OverloadedError:
+                outcomes["overloaded"] += 1
+            except CircuitOpenError:
+                outcomes["circuit_open"] += 1
+            except Exception:
+                outcomes["other"] += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    return outcomes, latencies, elapsed
+
+
+def report(name, server, outcomes, latencies, elapsed, client=None):
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"\n== {name} ({elapsed:.2f}s)")
+    print("   outcomes: " + ", ".join(f"{k}={v}" for k, v in outcomes.items()))
+    print(f"   latency ms: p50={p50:.0f} p99={p99:.0f}")
+    print(f"   server: served={server.served} throttled={server.throttled} failed={server.failed}")
+    if client is not None:
+        print(f"   client: {dict(client.stats)}")
+        print(f"   final limit={client.limiter.limit:.1f} breaker={client.breaker.state}")
+
+
+def fresh_server(args, error_rate=None, outage=False):
+    server = MockStripeServer(
+        args.latency_ms,
+        args.error_rate if error_rate is None else error_rate,
+        args.capacity,
+        outage,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stripe.api_base = f"http://127.0.0.1:{server.server_address[1]}"
+    return server
+
+
+async def main(args):
+    stripe.api_key = "sk_test_mock"
+    stripe.max_network_retries = 0
+
+    server = fresh_server(args)
+    outcomes, latencies, elapsed = await run_load(
+        lambda: run_in_threadpool(create_intent), args.requests, args.concurrency
+    )
+    report("direct", server, outcomes, latencies, elapsed)
+    server.shutdown()
+
+    server = fresh_server(args)
+    client = ResilientStripeClient(
+        limiter=AdaptiveConcurrencyLimiter(initial_limit=10, max_queue=args.concurrency),
+    )
+    outcomes, latencies, elapsed = await run_load(
+        lambda: client.call(create_intent), args.requests, args.concurrency
+    )
+    report("resilient", server, outcomes, latencies, elapsed, client)
+    server.shutdown()
+
+    server = fresh_server(args, error_rate=0.6)
+    client = ResilientStripeClient(breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30))
+    outcomes, latencies, elapsed = await run_load(
+        lambda: client.call(create_intent), args.requests, args.concurrency
+    )
+    report("throttled", server, outcomes, latencies, elapsed, client)
+    server.shutdown()
+
+    server = fresh_server(args, outage=True)
+    client = ResilientStripeClient(breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30))
+    outcomes, latencies, elapsed = await run_load(
+        lambda: client.call(create_intent), args.requests, args.concurrency
+    )
+    report("outage", server, outcomes, latencies, elapsed, client)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--capacity", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
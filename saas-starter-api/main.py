@@ -2,19 +2,85 @@
 SaaS Starter API - Production-ready FastAPI for GCP Cloud Run
 Demonstrates Firestore integration, health checks, and auto-scaling
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from google.cloud import firestore
+from logging_config import RequestIdMiddleware, configure_logging
+from timing import TimingMiddleware, debug_router, timed
 from datetime import datetime
+from typing import Optional
+import logging
 import os
 import time
 
+# Structured JSON logging (inline, or via a background thread with
+# LOG_HANDLER=queue); health-check access logs are sampled
+configure_logging("saas-starter-api", sampled_paths=("/",))
+logger = logging.getLogger(__name__)
+
+# Firestore client - created lazily on first use (or during warm-up) so a
+# cold start does not pay for the gRPC channel before serving traffic
+_db: Optional[firestore.Client] = None
+_db_error: Optional[Exception] = None
+
+
+def get_db() -> Optional[firestore.Client]:
+    """Return the Firestore client, or None if it could not be initialized"""
+    global _db, _db_error
+    if _db is None and _db_error is None:
+        try:
+            _db = firestore.Client()
+        except Exception as e:
+            _db_error = e
+            logger.warning("Firestore not initialized", extra={"error": str(e)})
+    return _db
+
+
+def require_db() -> firestore.Client:
+    """Return the Firestore client or raise 503 if it is unavailable"""
+    db = get_db()
+    if db is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Firestore not available"
+        )
+    return db
+
+
+def _warm_up_firestore():
+    """Create the client and issue one cheap read to open the gRPC channel"""
+    db = get_db()
+    if db is not None:
+        list(db.collection('saas_data').limit(1).stream())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _db
+
+    # Opt-in warm-up, intended to run behind a Cloud Run startup probe
+    if os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes"):
+        try:
+            await run_in_threadpool(_warm_up_firestore)
+        except Exception as e:
+            logger.warning("Firestore warm-up failed", extra={"error": str(e)})
+
+    yield
+
+    if _db is not None:
+        _db.close()
+        _db = None
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="SaaS Starter API",
     description="Production-ready API for GCP Cloud Run with Firestore",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware for web clients
@@ -26,13 +92,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Firestore client
-try:
-    db = firestore.Client()
-    firestore_enabled = True
-except Exception as e:
-    print(f"Firestore not initialized: {e}")
-    firestore_enabled = False
+# Per-request Server-Timing breakdown, slow-request capture and profiling
+app.add_middleware(TimingMiddleware)
+
+# Tag every request (and its log lines) with a request ID
+app.add_middleware(RequestIdMiddleware)
+
+# Protected /debug endpoints (timings, profiler); disabled unless DEBUG_TOKEN is set
+app.include_router(debug_router)
 
 # Store startup time for uptime calculation
 startup_time = time.time()
@@ -85,7 +152,7 @@ async def get_stats():
         users=1247,  # Sample data
         requests=request_count,
         uptime_seconds=uptime,
-        firestore_enabled=firestore_enabled,
+        firestore_enabled=get_db() is not None,
         timestamp=datetime.utcnow().isoformat()
     )
 
@@ -97,21 +164,18 @@ async def create_data(item: DataItem):
     global request_count
     request_count += 1
 
-    if not firestore_enabled:
-        raise HTTPException(
-            status_code=503,
-            detail="Firestore not available"
-        )
+    db = require_db()
 
     try:
         # Write to Firestore collection
         doc_ref = db.collection('saas_data').document(item.key)
-        doc_ref.set({
-            'value': item.value,
-            'metadata': item.metadata,
-            'created_at': firestore.SERVER_TIMESTAMP,
-            'updated_at': firestore.SERVER_TIMESTAMP
-        })
+        with timed("firestore_write"):
+            doc_ref.set({
+                'value': item.value,
+                'metadata': item.metadata,
+                'created_at': firestore.SERVER_TIMESTAMP,
+                'updated_at': firestore.SERVER_TIMESTAMP
+            })
 
         return {
             "success": True,
@@ -134,15 +198,12 @@ async def get_all_data():
     global request_count
     request_count += 1
 
-    if not firestore_enabled:
-        raise HTTPException(
-            status_code=503,
-            detail="Firestore not available"
-        )
+    db = require_db()
 
     try:
         # Read from Firestore collection
-        docs = db.collection('saas_data').limit(100).stream()
+        with timed("firestore_query"):
+            docs = list(db.collection('saas_data').limit(100).stream())
 
         data = []
         for doc in docs:
@@ -175,15 +236,12 @@ async def get_data_by_key(key: str):
     global request_count
     request_count += 1
 
-    if not firestore_enabled:
-        raise HTTPException(
-            status_code=503,
-            detail="Firestore not available"
-        )
+    db = require_db()
 
     try:
         doc_ref = db.collection('saas_data').document(key)
-        doc = doc_ref.get()
+        with timed("firestore_read"):
+            doc = doc_ref.get()
 
         if not doc.exists:
             raise HTTPException(
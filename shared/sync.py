@@ -0,0 +1,57 @@
+"""
+Copy the shared modules into each service directory.
+
+Every Cloud Run service is built (``gcloud run deploy --source .``) and run
+locally from its own directory, so each one keeps a committed copy of the
+modules in this directory. Edit them here, then run:
+
+    python shared/sync.py           # write the copies
+    python shared/sync.py --check   # exit 1 if any copy differs (CI)
+"""
+
+import argparse
+import os
+import sys
+
+SHARED_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(SHARED_DIR)
+
+MODULES = ("logging_config.py", "timing.py")
+SERVICES = ("analytics-backend", "saas-starter-api", "stripe-backend")
+
+
+def read(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def main_(args):
+    drifted = []
+    for module in MODULES:
+        source = read(os.path.join(SHARED_DIR, module))
+        for service in SERVICES:
+            target = os.path.join(REPO_ROOT, service, module)
+            if read(target) == source:
+                continue
+            drifted.append(os.path.relpath(target, REPO_ROOT))
+            if not args.check:
+                with open(target, "wb") as f:
+                    f.write(source)
+
+    if args.check and drifted:
+        print("Out of sync with shared/ (run python shared/sync.py):")
+        for path in drifted:
+            print(f"  {path}")
+        return 1
+    for path in drifted:
+        print(f"Updated {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--check", action="store_true", help="Only report copies that differ")
+    sys.exit(main_(parser.parse_args()))
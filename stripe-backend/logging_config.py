@@ -0,0 +1,271 @@
+"""
+Structured logging for the Cloud Run services.
+
+Records are written to stderr as one JSON object per line, which Cloud Logging
+parses (``severity``, ``message`` and any ``extra`` fields). LOG_HANDLER picks
+where that happens:
+
+- ``sync`` (default): formatted and written on the calling thread. Cheapest
+  while stderr never blocks, as on Cloud Run; a queue there adds listener
+  thread GIL contention (p99 ~900 µs vs ~150 µs per request in
+  benchmarks/logging_overhead.py).
+- ``queue``: log calls only enqueue the record and a QueueListener thread
+  writes it. Use it when writes can block (a backpressured pipe or a slow
+  log agent): once a write blocks at all (~60 µs or more), every log call
+  stalls the event loop inline, while the queue keeps per-request overhead
+  flat.
+
+- Every record carries the current request ID (set by RequestIdMiddleware).
+- Repetitive lines are sampled: pass ``extra={"sample_every": N}`` to keep one
+  in N occurrences of a message, and uvicorn access logs for the configured
+  health-check paths are sampled the same way.
+
+Edit shared/logging_config.py only. Each service is built from its own directory,
+so ``python shared/sync.py`` copies it into analytics-backend, saas-starter-api
+and stripe-backend, and ``--check`` (run in CI) fails when a copy drifts.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "color_message", "request_id", "sample_every", "sampled_count",
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON understood by Cloud Logging."""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "severity": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "sampled_count", None):
+            entry["sampled_count"] = record.sampled_count
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request ID; runs in the logging thread's caller."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one in N records of repetitive messages.
+
+    A record opts in with ``extra={"sample_every": N}``. Occurrences are counted
+    per logger and message template; the kept record reports how many
+    occurrences it stands for in ``sampled_count``.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def _keep(self, key, every: int, record: logging.LogRecord) -> bool:
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % every:
+            return False
+        record.sampled_count = every
+        return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        every = getattr(record, "sample_every", None)
+        if not every or every <= 1:
+            return True
+        return self._keep((record.name, record.msg), every, record)
+
+
+class AccessLogSampler(SamplingFilter):
+    """Sample uvicorn access log lines for noisy paths such as health checks."""
+
+    def __init__(self, paths: Iterable[str], every: int):
+        super().__init__()
+        self.paths = set(paths)
+        self.every = every
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # uvicorn access records: (client_addr, method, path, http_version, status)
+        args = record.args
+        if not isinstance(args, tuple) or len(args) < 5 or self.every <= 1:
+            return True
+        path = str(args[2]).split("?", 1)[0]
+        if path not in self.paths or int(args[4]) >= 400:
+            return True
+        return self._keep(path, self.every, record)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps records structured.
+
+    The stock handler copies the record and flattens exceptions into the
+    message. Here the record is updated in place (the queue handler is its
+    only consumer), the message is rendered so args need not be pickled or
+    shared across threads, and the traceback moves to exc_text so the
+    listener can emit it as its own JSON field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware that assigns each request an ID for log correlation.
+
+    Uses the incoming X-Request-ID header, falls back to the Cloud Run trace
+    ID, and otherwise generates one. The ID is echoed in the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")
+        if not request_id:
+            trace = headers.get(b"x-cloud-trace-context", b"").decode("latin-1")
+            request_id = trace.split("/", 1)[0] or uuid.uuid4().hex
+
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-request-id", request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+
+
+def configure_logging(
+    service: str,
+    level: int = logging.INFO,
+    sampled_paths: Iterable[str] = (),
+    access_sample_every: int = 100,
+    stream=None,
+    handler: Optional[str] = None,
+) -> Optional[logging.handlers.QueueListener]:
+    """
+    Route all logging through one JSON pipeline, inline or via a queue.
+
+    Replaces handlers on the root logger and uvicorn's loggers so that
+    everything, including access logs, goes through the same pipeline.
+    Safe to call more than once; the previous listener is stopped.
+
+    Args:
+        service: Service name added to every log entry
+        level: Root log level
+        sampled_paths: Request paths whose access log lines are sampled
+        access_sample_every: Keep one in this many sampled access lines
+        stream: Output stream (default: sys.stderr)
+        handler: "sync" to write on the calling thread, "queue" to hand records
+            to a background listener (default: LOG_HANDLER, else "sync")
+
+    Returns:
+        The running QueueListener, or None for the sync handler
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    handler = handler or os.getenv("LOG_HANDLER", "sync")
+    if handler not in ("sync", "queue"):
+        raise ValueError(f"LOG_HANDLER must be 'sync' or 'queue', not {handler!r}")
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter(service))
+
+    if handler == "queue":
+        log_queue = queue.SimpleQueue()
+        entry_handler = StructuredQueueHandler(log_queue)
+    else:
+        entry_handler = output
+    entry_handler.addFilter(RequestIdFilter())
+    entry_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.handlers = [entry_handler]
+    root.setLevel(level)
+
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    access_logger = logging.getLogger("uvicorn.access")
+    access_logger.filters = []
+    if sampled_paths:
+        access_logger.addFilter(AccessLogSampler(sampled_paths, access_sample_every))
+
+    if handler == "queue":
+        _listener = logging.handlers.QueueListener(
+            log_queue, output, respect_handler_level=True
+        )
+        _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -14,43 +14,85 @@ Key Features:
 
 import logging
 import os
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
 
-from fastapi import FastAPI, HTTPException, Request, Header
+from fastapi import Depends, FastAPI, HTTPException, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 import stripe
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from logging_config import RequestIdMiddleware, configure_logging
+from resilience import CircuitOpenError, OverloadedError, ResilientStripeClient
+from timing import TimingMiddleware, debug_router, require_debug_token, timed
+
+# Configure logging: JSON lines (inline, or via a background thread with
+# LOG_HANDLER=queue) with request IDs and sampled health-check access logs
+configure_logging("stripe-backend", sampled_paths=("/health",))
 logger = logging.getLogger(__name__)
 
-# Load environment variables from .env file
-load_dotenv()
+# All outbound Stripe calls go through this client: adaptive concurrency limit,
+# jittered retries for transient errors and a circuit breaker
+stripe_client = ResilientStripeClient()
+
+# Webhook signing secret, populated by configure_stripe() during startup
+WEBHOOK_SECRET: Optional[str] = None
+
+
+def configure_stripe() -> None:
+    """
+    Load environment variables and configure the Stripe client.
+
+    Runs from the application lifespan rather than at import time, so importing
+    the module stays cheap and configuration errors still abort startup before
+    any request is served.
+
+    Raises:
+        ValueError: If STRIPE_SECRET_KEY is not set
+    """
+    global WEBHOOK_SECRET
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    # Initialize Stripe with secret key from environment
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+
+    # Validate that required environment variables are set
+    if not stripe.api_key:
+        logger.error("STRIPE_SECRET_KEY environment variable is not set")
+        raise ValueError("STRIPE_SECRET_KEY must be set in environment variables")
+
+    if not WEBHOOK_SECRET:
+        logger.warning("STRIPE_WEBHOOK_SECRET is not set - webhook signature verification will fail")
 
-# Initialize Stripe with secret key from environment
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 
-# Validate that required environment variables are set
-if not stripe.api_key:
-    logger.error("STRIPE_SECRET_KEY environment variable is not set")
-    raise ValueError("STRIPE_SECRET_KEY must be set in environment variables")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Configure Stripe once per process before the first request."""
+    configure_stripe()
+    yield
 
-if not WEBHOOK_SECRET:
-    logger.warning("STRIPE_WEBHOOK_SECRET is not set - webhook signature verification will fail")
 
 # Initialize FastAPI application
 app = FastAPI(
     title="Stripe Payment API",
     description="Production-ready Stripe payment processing backend",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Per-request Server-Timing breakdown, slow-request capture and profiling
+app.add_middleware(TimingMiddleware)
+
+# Tag every request (and its log lines) with a request ID
+app.add_middleware(RequestIdMiddleware)
+
+# Protected /debug endpoints (timings, profiler); disabled unless DEBUG_TOKEN is set
+app.include_router(debug_router)
+
 # Configure CORS to allow requests from frontend (React app)
 app.add_middleware(
     CORSMiddleware,
@@ -124,7 +166,7 @@ async def health_check() -> Dict[str, str]:
         GET /health
         Response: {"status": "healthy"}
     """
-    logger.info("Health check requested")
+    logger.info("Health check requested", extra={"sample_every": 100})
     return {"status": "healthy"}
 
 
@@ -149,6 +191,8 @@ async def create_payment_intent(request: PaymentIntentRequest) -> Dict[str, str]
 
     Raises:
         HTTPException: 400 if Stripe API returns an error
+        HTTPException: 429 if Stripe is still rate limiting after retries
+        HTTPException: 503 if Stripe calls are shedding load or failing fast
         HTTPException: 500 for unexpected errors
 
     Example:
@@ -163,12 +207,18 @@ async def create_payment_intent(request: PaymentIntentRequest) -> Dict[str, str]
     """
     try:
         logger.info(
-            f"Creating payment intent for order {request.order_id}: "
-            f"${request.amount/100:.2f} {request.currency.upper()}"
+            "Creating payment intent",
+            extra={
+                "order_id": request.order_id,
+                "amount": request.amount,
+                "currency": request.currency,
+            }
         )
 
-        # Create payment intent with Stripe
-        intent = stripe.PaymentIntent.create(
+        # Create payment intent with Stripe (retried on transient errors
+        # with a single idempotency key, so no duplicate intents)
+        intent = await stripe_client.call(
+            stripe.PaymentIntent.create,
             amount=request.amount,
             currency=request.currency,
             # Enable automatic payment methods (card, Google Pay, Apple Pay, etc.)
@@ -182,24 +232,45 @@ async def create_payment_intent(request: PaymentIntentRequest) -> Dict[str, str]
             description=f"Order {request.order_id}"
         )
 
-        logger.info(f"Payment intent created successfully: {intent.id}")
+        logger.info(
+            "Payment intent created successfully",
+            extra={"order_id": request.order_id, "payment_intent_id": intent.id}
+        )
 
         # Return only the client_secret - never expose the full intent object
         return {"client_secret": intent.client_secret}
 
     except stripe.error.CardError as e:
         # Card was declined
-        logger.error(f"Card error: {e.user_message}")
+        logger.error("Card error", extra={"error": e.user_message})
         raise HTTPException(status_code=400, detail=e.user_message)
 
     except stripe.error.RateLimitError as e:
-        # Too many requests to Stripe API
-        logger.error("Stripe rate limit exceeded")
+        # Too many requests to Stripe API, even after retrying with backoff
+        logger.error("Stripe rate limit exceeded after retries")
         raise HTTPException(status_code=429, detail="Too many requests. Please try again shortly.")
 
+    except CircuitOpenError as e:
+        # Stripe has been failing repeatedly - fail fast instead of piling on
+        logger.error("Stripe circuit open", extra={"retry_after": e.retry_after})
+        raise HTTPException(
+            status_code=503,
+            detail="Payment service temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+
+    except OverloadedError as e:
+        # Too many concurrent Stripe calls queued in this instance
+        logger.error("Stripe call queue overloaded", extra={"error": str(e)})
+        raise HTTPException(
+            status_code=503,
+            detail="Payment service is busy. Please try again shortly.",
+            headers={"Retry-After": "1"}
+        )
+
     except stripe.error.InvalidRequestError as e:
         # Invalid parameters sent to Stripe
-        logger.error(f"Invalid request to Stripe: {str(e)}")
+        logger.error("Invalid request to Stripe", extra={"error": str(e)})
         raise HTTPException(status_code=400, detail="Invalid payment parameters")
 
     except stripe.error.AuthenticationError as e:
@@ -209,7 +280,7 @@ async def create_payment_intent(request: PaymentIntentRequest) -> Dict[str, str]
 
     except stripe.error.StripeError as e:
         # Generic Stripe error
-        logger.error(f"Stripe error: {str(e)}")
+        logger.error("Stripe error", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail="Payment processing error")
 
     except Exception as e:
@@ -268,11 +339,15 @@ async def webhook_handler(
     try:
         # Verify webhook signature and construct event
         # This prevents processing of fake/tampered webhook events
-        event = stripe.Webhook.construct_event(
-            payload, stripe_signature, WEBHOOK_SECRET
-        )
+        with timed("verify_signature"):
+            event = stripe.Webhook.construct_event(
+                payload, stripe_signature, WEBHOOK_SECRET
+            )
 
-        logger.info(f"Webhook received: {event['type']} (ID: {event['id']})")
+        logger.info(
+            "Webhook received",
+            extra={"event_type": event['type'], "event_id": event['id']}
+        )
 
     except ValueError as e:
         # Invalid payload
@@ -281,7 +356,7 @@ async def webhook_handler(
 
     except stripe.error.SignatureVerificationError as e:
         # Invalid signature - possible attack attempt
-        logger.error(f"Webhook signature verification failed: {str(e)}")
+        logger.error("Webhook signature verification failed", extra={"error": str(e)})
         raise HTTPException(status_code=400, detail="Invalid signature")
 
     # Handle different event types
@@ -296,8 +371,12 @@ async def webhook_handler(
             amount = payment_intent.get('amount')
 
             logger.info(
-                f"✓ Payment succeeded for order {order_id}: "
-                f"${amount/100:.2f} (Payment Intent: {payment_intent['id']})"
+                "Payment succeeded",
+                extra={
+                    "order_id": order_id,
+                    "amount": amount,
+                    "payment_intent_id": payment_intent['id'],
+                }
             )
 
             # TODO: Update order status in your database
@@ -311,8 +390,12 @@ async def webhook_handler(
             error_message = payment_intent.get('last_payment_error', {}).get('message', 'Unknown error')
 
             logger.warning(
-                f"✗ Payment failed for order {order_id}: {error_message} "
-                f"(Payment Intent: {payment_intent['id']})"
+                "Payment failed",
+                extra={
+                    "order_id": order_id,
+                    "error": error_message,
+                    "payment_intent_id": payment_intent['id'],
+                }
             )
 
             # TODO: Handle failed payment
@@ -322,17 +405,17 @@ async def webhook_handler(
         elif event_type == 'payment_intent.created':
             # Payment intent was created
             payment_intent = event_data
-            logger.info(f"Payment intent created: {payment_intent['id']}")
+            logger.info("Payment intent created", extra={"payment_intent_id": payment_intent['id']})
 
         elif event_type == 'charge.succeeded':
             # Charge was successful (after payment intent succeeded)
             charge = event_data
-            logger.info(f"Charge succeeded: {charge['id']}")
+            logger.info("Charge succeeded", extra={"charge_id": charge['id']})
 
         elif event_type == 'customer.subscription.created':
             # New subscription created
             subscription = event_data
-            logger.info(f"Subscription created: {subscription['id']}")
+            logger.info("Subscription created", extra={"subscription_id": subscription['id']})
 
             # TODO: Activate subscription in your system
             # await activate_subscription(subscription)
@@ -340,19 +423,19 @@ async def webhook_handler(
         elif event_type == 'customer.subscription.updated':
             # Subscription updated (plan change, etc.)
             subscription = event_data
-            logger.info(f"Subscription updated: {subscription['id']}")
+            logger.info("Subscription updated", extra={"subscription_id": subscription['id']})
 
         elif event_type == 'customer.subscription.deleted':
             # Subscription cancelled
             subscription = event_data
-            logger.info(f"Subscription deleted: {subscription['id']}")
+            logger.info("Subscription deleted", extra={"subscription_id": subscription['id']})
 
             # TODO: Deactivate subscription in your system
             # await deactivate_subscription(subscription)
 
         else:
             # Unhandled event type
-            logger.info(f"Unhandled event type: {event_type}")
+            logger.info("Unhandled event type", extra={"event_type": event_type})
 
         # Return 200 OK to acknowledge successful receipt
         # Stripe will retry if we return any other status code
@@ -361,7 +444,7 @@ async def webhook_handler(
     except Exception as e:
         # Log error but still return 200 to prevent Stripe from retrying
         # (only do this for non-critical errors)
-        logger.exception(f"Error processing webhook event {event['id']}: {str(e)}")
+        logger.exception("Error processing webhook event", extra={"event_id": event['id']})
 
         # For critical operations, raise HTTPException to trigger Stripe retry
         # raise HTTPException(status_code=500, detail="Error processing webhook")
@@ -369,6 +452,41 @@ async def webhook_handler(
         return {"status": "success"}
 
 
+@app.get("/debug/stripe", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+async def get_stripe_client_stats():
+    """
+    Resilience counters for this instance's Stripe calls since startup
+
+    Returns call, retry and failure counts, queue and circuit rejections, the
+    current adaptive concurrency limit and the circuit breaker state. Protected
+    like the other /debug endpoints (X-Debug-Token).
+    """
+    return {
+        "status": "success",
+        "counters": {
+            name: stripe_client.stats[name]
+            for name in (
+                "calls",
+                "succeeded",
+                "retryable_errors",
+                "retries",
+                "failed",
+                "queue_rejected",
+                "circuit_rejected",
+            )
+        },
+        "limiter": {
+            "limit": round(stripe_client.limiter.limit, 2),
+            "in_flight": stripe_client.limiter.in_flight,
+            "queued": stripe_client.limiter.queued,
+        },
+        "breaker": {
+            "state": stripe_client.breaker.state,
+            "retry_after": round(stripe_client.breaker.retry_after, 1),
+        },
+    }
+
+
 # Run the application
 if __name__ == "__main__":
     import uvicorn
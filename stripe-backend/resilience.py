@@ -0,0 +1,339 @@
+"""
+Client-side resilience layer for outbound Stripe API calls.
+
+Stripe enforces per-account rate limits and occasionally returns transient
+errors. Instead of passing these straight to the customer, every call goes
+through three mechanisms:
+
+- AdaptiveConcurrencyLimiter: caps in-flight Stripe calls with an AIMD limit
+  (additive increase on success, multiplicative decrease on 429s/timeouts).
+  Callers over the limit wait in a short, bounded queue.
+- Retries: retryable errors are retried with full-jitter exponential backoff,
+  reusing one idempotency key so a retried create never duplicates an object.
+- CircuitBreaker: after several consecutive calls fail every retry with a
+  connection error or Stripe 5xx, calls fail fast for a cool-down period
+  before a single probe call is allowed through. Rate limits (429) are left
+  to the limiter and never open the circuit.
+
+Stripe's Python client is synchronous, so calls run in the threadpool and the
+event loop stays free while waiting on the network.
+"""
+
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Optional
+
+import stripe
+from fastapi.concurrency import run_in_threadpool
+
+from timing import timed
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: throttling, network failures and Stripe-side 5xx.
+# Card, validation and authentication errors are permanent and raised as-is.
+RETRYABLE_ERRORS = (
+    stripe.error.RateLimitError,
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+)
+
+# Errors that indicate Stripe is overloaded and the concurrency limit should shrink
+OVERLOAD_ERRORS = (
+    stripe.error.RateLimitError,
+    stripe.error.APIConnectionError,
+)
+
+
+class OverloadedError(Exception):
+    """Raised when the wait queue is full or a queued call waited too long."""
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker is open and calls fail fast."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit open, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit with a bounded FIFO wait queue.
+
+    Attributes:
+        limit: Current concurrency limit (fractional; int(limit) slots are usable)
+        in_flight: Number of calls currently holding a slot
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = 10,
+        min_limit: float = 1,
+        max_limit: float = 50,
+        backoff_ratio: float = 0.5,
+        max_queue: int = 20,
+        queue_timeout: float = 2.0,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.backoff_ratio = backoff_ratio
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        """Number of callers waiting for a slot"""
+        return len(self._waiters)
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(1, int(self.limit))
+
+    async def acquire(self) -> None:
+        """
+        Take a slot, waiting in the queue if the limit is reached.
+
+        Raises:
+            OverloadedError: If the queue is full or the wait times out
+        """
+        if self._has_capacity() and not self._waiters:
+            self.in_flight += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            raise OverloadedError("Stripe call queue is full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands the slot over by incrementing in_flight for us
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            raise OverloadedError("Timed out waiting for a Stripe call slot")
+        except asyncio.CancelledError:
+            # The caller went away: hand back a slot granted meanwhile, or leave the queue
+            if waiter.done() and not waiter.cancelled():
+                self.release(adjust=False)
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, overloaded: bool = False, adjust: bool = True) -> None:
+        """Return a slot and, unless adjust is False, adapt the limit to the outcome."""
+        self.in_flight -= 1
+        if adjust and overloaded:
+            self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        elif adjust:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker, fed one outcome per call (not per attempt).
+
+    States:
+        closed: calls pass through, failures are counted
+        open: calls fail fast until reset_timeout has elapsed
+        half_open: one probe call is allowed; success closes, failure re-opens
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 when not open)."""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def before_call(self) -> bool:
+        """
+        Check whether a call may proceed.
+
+        Returns:
+            True if this call is the half-open probe
+
+        Raises:
+            CircuitOpenError: If the circuit is open or a probe is already running
+        """
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        raise CircuitOpenError(self.retry_after)
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    def abort_probe(self) -> None:
+        """Let another probe through after one ended without an outcome (cancelled)."""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probe_in_flight or self._failures >= self.failure_threshold:
+            if self._opened_at is None or self._probe_in_flight:
+                logger.warning(
+                    "Stripe circuit opened",
+                    extra={"consecutive_failures": self._failures}
+                )
+            self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+
+class ResilientStripeClient:
+    """
+    Runs Stripe SDK calls through the limiter, retry policy and circuit breaker.
+
+    Example:
+        intent = await stripe_client.call(stripe.PaymentIntent.create, amount=2999, currency="usd")
+    """
+
+    def __init__(
+        self,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        max_attempts: int = 4,
+        base_delay: float = 0.1,
+        max_delay: float = 2.0,
+    ):
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = Counter()
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (0-based) attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Call a Stripe SDK function with retries, concurrency limiting and fail-fast.
+
+        An idempotency key is generated (unless one is passed) and reused on
+        every attempt.
+
+        Raises:
+            CircuitOpenError: If Stripe has been failing and the circuit is open
+            OverloadedError: If no call slot became available in time
+            stripe.error.StripeError: The last error once retries are exhausted,
+                or any non-retryable error immediately
+        """
+        kwargs.setdefault("idempotency_key", str(uuid.uuid4()))
+        self.stats["calls"] += 1
+        is_probe = False
+        verdict_recorded = False
+
+        try:
+            for attempt in range(self.max_attempts):
+                # Fail fast without queueing while the circuit is open
+                if self.breaker.state == "open":
+                    self.stats["circuit_rejected"] += 1
+                    raise CircuitOpenError(self.breaker.retry_after)
+
+                try:
+                    with timed("stripe_queue"):
+                        await self.limiter.acquire()
+                except OverloadedError:
+                    self.stats["queue_rejected"] += 1
+                    raise
+
+                # Re-check after queueing: the circuit may have opened meanwhile.
+                # Only the first attempt asks, so a probe keeps its retries.
+                if attempt == 0:
+                    try:
+                        is_probe = self.breaker.before_call()
+                    except CircuitOpenError:
+                        self.limiter.release(adjust=False)
+                        self.stats["circuit_rejected"] += 1
+                        raise
+
+                # The slot is always returned in the finally block. error stays
+                # None for success and permanent errors (declined card, bad
+                # request), which mean Stripe itself is healthy.
+                settled = False
+                error: Optional[Exception] = None
+                try:
+                    with timed("stripe_api"):
+                        result = await run_in_threadpool(fn, *args, **kwargs)
+                    settled = True
+                except RETRYABLE_ERRORS as e:
+                    error = e
+                    settled = True
+                except Exception:
+                    settled = True
+                    self.breaker.record_success()
+                    verdict_recorded = True
+                    raise
+                finally:
+                    if not settled:
+                        # Cancelled (client disconnect, shutdown, outer timeout)
+                        self.limiter.release(adjust=False)
+                    else:
+                        self.limiter.release(overloaded=isinstance(error, OVERLOAD_ERRORS))
+
+                if error is None:
+                    self.breaker.record_success()
+                    verdict_recorded = True
+                    self.stats["succeeded"] += 1
+                    return result
+
+                self.stats["retryable_errors"] += 1
+                if attempt + 1 >= self.max_attempts or self.breaker.state == "open":
+                    self.stats["failed"] += 1
+                    # One breaker verdict per call. Throttling (429) is the
+                    # limiter's job and never opens the circuit.
+                    if not isinstance(error, stripe.error.RateLimitError):
+                        self.breaker.record_failure()
+                        verdict_recorded = True
+                    raise error
+                self.stats["retries"] += 1
+                with timed("stripe_backoff"):
+                    await asyncio.sleep(self._backoff(attempt))
+        finally:
+            # Cancelled or throttled probes give no verdict; let another probe through
+            if is_probe and not verdict_recorded:
+                self.breaker.abort_probe()
@@ -0,0 +1,226 @@
+"""
+Per-request timing and on-demand profiling for the Cloud Run services.
+
+- TimingMiddleware times every request and the downstream calls wrapped in
+  ``timed("name")`` (Firestore RPCs, Stripe calls, ...). The breakdown is
+  returned in a ``Server-Timing`` header and aggregated per route.
+- Requests slower than SLOW_REQUEST_MS are sampled (SLOW_REQUEST_SAMPLE_RATE)
+  into a fixed-size ring buffer.
+- ``debug_router`` exposes the aggregates and slow requests, and can arm a
+  pyinstrument profiler for the next N requests. It requires the
+  X-Debug-Token header to match DEBUG_TOKEN and is disabled when that is unset.
+
+Edit shared/timing.py only. Each service is built from its own directory,
+so ``python shared/sync.py`` copies it into analytics-backend, saas-starter-api
+and stripe-backend, and ``--check`` (run in CI) fails when a copy drifts.
+"""
+
+import hmac
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import HTMLResponse, PlainTextResponse
+
+from logging_config import request_id_var
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "1.0"))
+SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", "100"))
+MAX_PROFILED_REQUESTS = 20
+
+# (name, duration_ms) pairs recorded during the current request
+_timings_var: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("timings", default=None)
+
+# Aggregates keyed by route ("POST track_event", by endpoint name so unmatched
+# paths cannot grow it) and by "route > downstream call"
+route_stats: Dict[str, Dict[str, float]] = {}
+slow_requests: deque = deque(maxlen=SLOW_REQUEST_BUFFER)
+
+# Profiler state: how many upcoming requests to profile, and their reports
+_profile_remaining = 0
+_profile_active = False
+profile_reports: deque = deque(maxlen=MAX_PROFILED_REQUESTS)
+
+
+@contextmanager
+def timed(name: str):
+    """
+    Time a block and add it to the current request's Server-Timing breakdown.
+
+    Example:
+        with timed("firestore_query"):
+            events = list(query.stream())
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _timings_var.get()
+        if timings is not None:
+            timings.append((name, (time.perf_counter() - start) * 1000))
+
+
+def _record_stat(key: str, duration_ms: float) -> None:
+    stat = route_stats.get(key)
+    if stat is None:
+        stat = route_stats[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+    stat["count"] += 1
+    stat["total_ms"] += duration_ms
+    stat["max_ms"] = max(stat["max_ms"], duration_ms)
+
+
+def _server_timing(timings: List[Tuple[str, float]], total_ms: float) -> str:
+    """Build a Server-Timing value, summing repeated metrics of the same name."""
+    merged: Dict[str, float] = {}
+    for name, duration_ms in timings:
+        merged[name] = merged.get(name, 0.0) + duration_ms
+    parts = [f"{name};dur={duration_ms:.1f}" for name, duration_ms in merged.items()]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+class TimingMiddleware:
+    """ASGI middleware recording per-request timings and running armed profiles."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _profile_remaining, _profile_active
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: List[Tuple[str, float]] = []
+        token = _timings_var.set(timings)
+        status = {"code": 500}
+        start = time.perf_counter()
+
+        profiler = None
+        if _profile_remaining > 0 and not _profile_active and not scope["path"].startswith("/debug"):
+            from pyinstrument import Profiler
+
+            _profile_remaining -= 1
+            _profile_active = True
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                total_ms = (time.perf_counter() - start) * 1000
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", _server_timing(timings, total_ms).encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            total_ms = (time.perf_counter() - start) * 1000
+            _timings_var.reset(token)
+
+            if profiler is not None:
+                profiler.stop()
+                _profile_active = False
+                profile_reports.append({
+                    "path": scope["path"],
+                    "request_id": request_id_var.get(),
+                    "duration_ms": round(total_ms, 1),
+                    "html": profiler.output_html(),
+                    "text": profiler.output_text(unicode=True),
+                })
+
+            endpoint = scope.get("endpoint")
+            route = f"{scope['method']} {getattr(endpoint, '__name__', 'unmatched')}"
+            _record_stat(route, total_ms)
+            for name, duration_ms in timings:
+                _record_stat(f"{route} > {name}", duration_ms)
+
+            if total_ms >= SLOW_REQUEST_MS and random.random() < SLOW_REQUEST_SAMPLE_RATE:
+                slow_requests.append({
+                    "time": datetime.now(timezone.utc).isoformat(),
+                    "request_id": request_id_var.get(),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status["code"],
+                    "duration_ms": round(total_ms, 1),
+                    "timings": [{"name": n, "duration_ms": round(d, 1)} for n, d in timings],
+                })
+
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)) -> None:
+    """Allow debug endpoints only with a matching X-Debug-Token header."""
+    expected = os.getenv("DEBUG_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_debug_token or not hmac.compare_digest(x_debug_token, expected):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+debug_router = APIRouter(
+    prefix="/debug",
+    tags=["Debug"],
+    include_in_schema=False,
+    dependencies=[Depends(require_debug_token)],
+)
+
+
+@debug_router.get("/timings")
+async def get_timings():
+    """Per-route and per-downstream-call timing aggregates plus recent slow requests"""
+    return {
+        "routes": {
+            key: {
+                "count": stat["count"],
+                "avg_ms": round(stat["total_ms"] / stat["count"], 1),
+                "max_ms": round(stat["max_ms"], 1),
+            }
+            for key, stat in sorted(route_stats.items())
+        },
+        "slow_request_threshold_ms": SLOW_REQUEST_MS,
+        "slow_requests": list(slow_requests),
+    }
+
+
+@debug_router.post("/profile")
+async def start_profiling(requests: int = Query(1, ge=1, le=MAX_PROFILED_REQUESTS)):
+    """Profile the next N requests (one at a time) with pyinstrument"""
+    global _profile_remaining
+    try:
+        import pyinstrument  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=501, detail="pyinstrument is not installed")
+
+    _profile_remaining = requests
+    profile_reports.clear()
+    return {"status": "armed", "requests": requests}
+
+
+@debug_router.get("/profile")
+async def get_profile(
+    index: int = Query(-1),
+    format: str = Query("html", pattern="^(html|text)$"),
+):
+    """Return a captured profile report (latest by default) as HTML or text"""
+    if not profile_reports:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No profiles captured yet ({_profile_remaining} requests pending)"
+        )
+    try:
+        report = profile_reports[index]
+    except IndexError:
+        raise HTTPException(status_code=404, detail=f"No profile at index {index}")
+
+    if format == "text":
+        return PlainTextResponse(report["text"])
+    return HTMLResponse(report["html"])